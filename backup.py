@@ -23,17 +23,16 @@ def save_categories():
         json.dump(st.session_state.categories, f) 
 
 def categorize_transactions(df):
-    df["Category"] = "Uncategorized"
-
-    for category, keywords in st.session_state.categories.items():
-        if category == "Uncategorized" or not keywords:
-            continue
+    # map each lowercased keyword to its category once, then look up every row in one pass
+    keyword_to_category = {
+        keyword.lower().strip(): category
+        for category, keywords in st.session_state.categories.items()
+        if category != "Uncategorized"
+        for keyword in keywords
+    }
 
-        lowered_keywords = [keyword.lower().strip() for keyword in keywords]
-        for idx, row in df.iterrows(): # iterate over each row
-            details = row["Details"].lower()
-            if details in lowered_keywords:
-                df.at[idx, "Category"] = category 
+    details_lc = df["Details"].str.lower().str.strip()
+    df["Category"] = details_lc.map(keyword_to_category).fillna("Uncategorized")
 
     return df
             
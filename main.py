@@ -1,77 +1,184 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
+import numpy as np
+import plotly.graph_objects as go
+import io
 import json
 import os
+import re
 
 st.set_page_config(page_title="Simple Finance App", page_icon="💰", layout="wide")
 
 category_file = "categories.json"
 budget_file = "budgets.json"
+csv_chunk_rows = 100_000
+chart_max_categories = 30
 
 if "categories" not in st.session_state:
     st.session_state.categories = {
-        "Uncategorized": [],
+        "Uncategorized": set(),
     }
 
+if "categories_version" not in st.session_state:
+    st.session_state.categories_version = 0
+
 if "budgets" not in st.session_state:
     st.session_state.budgets = {}
 
+# the JSON files are only re-read when they changed on disk since this session last read or wrote them
 if os.path.exists(category_file):
-    with open(category_file, "r") as f:
-        st.session_state.categories = json.load(f)
+    categories_mtime = os.stat(category_file).st_mtime_ns
+    if st.session_state.get("categories_mtime") != categories_mtime:
+        with open(category_file, "r") as f:
+            # keywords are kept as sets in memory for constant-time membership checks
+            st.session_state.categories = {
+                category: set(keywords) for category, keywords in json.load(f).items()
+            }
+        st.session_state.categories_version += 1
+        st.session_state.categories_mtime = categories_mtime
 
 if os.path.exists(budget_file):
-    with open(budget_file, "r") as f:
-        st.session_state.budgets = json.load(f)
+    budgets_mtime = os.stat(budget_file).st_mtime_ns
+    if st.session_state.get("budgets_mtime") != budgets_mtime:
+        with open(budget_file, "r") as f:
+            st.session_state.budgets = json.load(f)
+        st.session_state.budgets_mtime = budgets_mtime
 
 for cat in st.session_state.categories.keys():
     st.session_state.budgets.setdefault(cat, 0.0)
 
 
+def serializable_categories():
+    return {category: sorted(keywords) for category, keywords in st.session_state.categories.items()}
+
+
+def get_categories_key():
+    # serialize the categories again only after an edit has bumped their version
+    version = st.session_state.categories_version
+    if st.session_state.get("categories_key_version") != version:
+        # not sort_keys: the matcher relies on the categories' insertion order
+        st.session_state.categories_key = json.dumps(serializable_categories())
+        st.session_state.categories_key_version = version
+    return st.session_state.categories_key
+
+
 def save_categories():
     with open(category_file, "w") as f:
-        json.dump(st.session_state.categories, f) 
+        json.dump(serializable_categories(), f)
+    st.session_state.categories_mtime = os.stat(category_file).st_mtime_ns
 
 
 def save_budgets():
     with open(budget_file, "w") as f:
         json.dump(st.session_state.budgets, f)
+    st.session_state.budgets_mtime = os.stat(budget_file).st_mtime_ns
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def get_keyword_matcher(categories_key):
+    # built once per distinct set of categories and shared across reruns and sessions
+    keyword_to_category = {
+        keyword.lower().strip(): category
+        for category, keywords in json.loads(categories_key).items()
+        if category != "Uncategorized"
+        for keyword in keywords
+        if keyword.strip()
+    }
+    # re returns the leftmost match; listing longer keywords first only decides between
+    # keywords that match at the same position, where the longest (most specific) one wins
+    alternation = "|".join(
+        re.escape(keyword) for keyword in sorted(keyword_to_category, key=len, reverse=True)
+    )
+    return keyword_to_category, re.compile(f"({alternation})")
 
 
-def categorize_transactions(df):
+def categorize_transactions(df, keyword_matcher, category_names):
+    keyword_to_category, pattern = keyword_matcher
     df["Category"] = "Uncategorized"
 
-    for category, keywords in st.session_state.categories.items():
-        if category == "Uncategorized" or not keywords:
-            continue
-
-        lowered_keywords = [keyword.lower().strip() for keyword in keywords]
-        for idx, row in df.iterrows():  # iterate over each row
-            details = row["Details"].lower()
-            if details in lowered_keywords:
-                df.at[idx, "Category"] = category 
+    if keyword_to_category:
+        # a single regex scan per row finds the first keyword contained in the details
+        matched = df["_details_lc"].str.extract(pattern, expand=False)
+        df["Category"] = matched.map(keyword_to_category).fillna("Uncategorized")
 
+    # store categories as integer codes rather than one Python string per row
+    df["Category"] = pd.Categorical(df["Category"], categories=category_names)
     return df
             
 
+def _parse_chunk(chunk):
+    chunk.columns = [col.strip() for col in chunk.columns]
+    # read_csv leaves Amount as text when a value is not a number; fail the upload instead
+    chunk["Amount"] = pd.to_numeric(chunk["Amount"], errors="raise")
+    # date, name of month, year; statements only have day resolution, so store whole seconds
+    chunk["Date"] = pd.to_datetime(chunk["Date"], format="%d %b %Y").astype("datetime64[s]")
+    # lowercased once here and reused whenever the transactions are recategorized
+    # a chunk whose Details are all blank is inferred as float, so cast before using .str
+    chunk["_details_lc"] = chunk["Details"].astype("string").str.lower().str.strip()
+    return chunk
+
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def _parse_csv(data):
+    # cached on the uploaded bytes, so reruns reuse the parsed frame instead of re-reading the CSV.
+    # large statements are read in chunks so only one chunk of raw strings is alive at a time
+    # thousands="," parses amounts like "18,551.62" straight to floats
+    with pd.read_csv(io.BytesIO(data), thousands=",", chunksize=csv_chunk_rows) as reader:
+        df = pd.concat((_parse_chunk(chunk) for chunk in reader), ignore_index=True)
+    df["Debit/Credit"] = df["Debit/Credit"].astype("category")
+    return df
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _categorize(data, categories_key, _keyword_matcher, _category_names):
+    # keyed on the file bytes and the categories only; the matcher and names are derived from the latter
+    return categorize_transactions(_parse_csv(data), _keyword_matcher, _category_names)
+
+
 def load_transactions(file):
     try:
-        df = pd.read_csv(file)
-        df.columns = [col.strip() for col in df.columns] 
-        df["Amount"] = df["Amount"].str.replace(",", "").astype(float)
-        df["Date"] = pd.to_datetime(df["Date"], format="%d %b %Y")  # date, name of month, year
-        return categorize_transactions(df)
+        categories_key = get_categories_key()
+        return _categorize(
+            file.getvalue(),
+            categories_key,
+            get_keyword_matcher(categories_key),
+            list(st.session_state.categories.keys()),
+        )
     except Exception as e:
         st.error(f"Error loading file: {str(e)}")
         return None
 
 
-def add_keyword_to_category(category, keyword):
+def sum_by_category(df):
+    # scatter-add the amounts onto the categorical codes; rows without a category have code -1
+    codes = df["Category"].cat.codes.to_numpy()
+    amounts = df["Amount"].to_numpy()
+    categorized = codes >= 0
+    # skip blank amounts as groupby().sum() does, otherwise the NaN spreads to the category total
+    valid = categorized & ~np.isnan(amounts)
+    n_categories = len(df["Category"].cat.categories)
+    totals = np.bincount(codes[valid], weights=amounts[valid], minlength=n_categories)
+    counts = np.bincount(codes[categorized], minlength=n_categories)
+
+    observed = np.flatnonzero(counts)  # only categories that have transactions
+    order = observed[np.argsort(-totals[observed], kind="stable")]  # sort in descending order
+    return pd.DataFrame({
+        "Category": df["Category"].cat.categories[order],
+        "Amount": totals[order],
+    })
+
+
+def add_keyword_to_category(category, keyword, persist=True):
     keyword = keyword.strip()
-    if keyword and keyword not in st.session_state.categories[category]:
-        st.session_state.categories[category].append(keyword)
-        save_categories()
+    keywords = st.session_state.categories[category]
+    if keyword and keyword not in keywords:
+        # a keyword belongs to one category, so the newly learned assignment wins
+        for other_keywords in st.session_state.categories.values():
+            other_keywords.discard(keyword)
+        keywords.add(keyword)
+        st.session_state.categories_version += 1
+        if persist:
+            save_categories()
         return True
     return False
 
@@ -85,12 +192,16 @@ def main():
         df = load_transactions(uploaded_file)
 
         if df is not None:
-            debits_df = df[df["Debit/Credit"] == "Debit"].copy()
-            credits_df = df[df["Debit/Credit"] == "Credit"].copy()
-
-            st.session_state.debits_df = debits_df.copy()
-
-            tab1, tab2 = st.tabs(["Expenses (Debits)", "Payments (Credits)"])
+            # split debits from credits by comparing the categorical codes; rows that are
+            # neither "Debit" nor "Credit" belong to neither side
+            is_debit = df["Debit/Credit"].eq("Debit").to_numpy()
+            is_credit = df["Debit/Credit"].eq("Credit").to_numpy()
+            st.session_state.debits_df = df.loc[
+                is_debit, ["Date", "Details", "Amount", "Category"]
+            ].reset_index(drop=True)
+            credits_df = df.loc[is_credit]
+
+            tab1, tab2 = st.tabs(["Expenses (Debits)", "Payments (Credits)"], key="active_tab", on_change="rerun")
             with tab1:
   
                 new_category = st.text_input("New Category Name")
@@ -98,7 +209,8 @@ def main():
 
                 if add_button and new_category:
                     if new_category not in st.session_state.categories:  # add category
-                        st.session_state.categories[new_category] = []
+                        st.session_state.categories[new_category] = set()
+                        st.session_state.categories_version += 1
                         # also initialize a budget entry for this new category
                         st.session_state.budgets.setdefault(new_category, 0.0)
                         save_categories()
@@ -108,26 +220,29 @@ def main():
 
                 st.subheader("Category Budgets")
 
-                cols = st.columns(3)
-                for i, cat in enumerate(st.session_state.categories.keys()):
-                    with cols[i % 3]:
-                        current_value = float(st.session_state.budgets.get(cat, 0.0))
-                        st.session_state.budgets[cat] = st.number_input(
-                            f"{cat} budget",
-                            min_value=0.0,
-                            step=10.0,
-                            value=current_value,
-                            key=f"budget_{cat}",
-                        )
-
-                if st.button("Save Budgets"):
+                # inputs inside a form only trigger a rerun when the form is submitted
+                with st.form("budgets_form"):
+                    cols = st.columns(3)
+                    for i, cat in enumerate(st.session_state.categories.keys()):
+                        with cols[i % 3]:
+                            current_value = float(st.session_state.budgets.get(cat, 0.0))
+                            st.session_state.budgets[cat] = st.number_input(
+                                f"{cat} budget",
+                                min_value=0.0,
+                                step=10.0,
+                                value=current_value,
+                                key=f"budget_{cat}",
+                            )
+                    submitted = st.form_submit_button("Save Budgets")
+
+                if submitted:
                     save_budgets()
                     st.success("Budgets saved to budgets.json")
 
 
                 st.subheader("Your Expenses")
                 edited_df = st.data_editor(
-                    st.session_state.debits_df[["Date", "Details", "Amount", "Category"]],
+                    st.session_state.debits_df,
                     column_config={
                         "Date": st.column_config.DateColumn("Date", format="DD/MM/YYY"),
                         "Amount": st.column_config.NumberColumn("Amount", format="%.2fAED"),
@@ -143,62 +258,70 @@ def main():
 
                 save_button = st.button("Apply Changes", type="primary")
                 if save_button:
-                    for idx, row in edited_df.iterrows():
-                        new_category_val = row["Category"]
-                        if row["Category"] == st.session_state.debits_df.at[idx, "Category"]:
-                            continue
-                         
-                        details = row["Details"]
-                        st.session_state.debits_df.at[idx, "Category"] = new_category_val
-                        add_keyword_to_category(new_category_val, details)
-
-                st.subheader("Expense Summary")
-                category_totals = st.session_state.debits_df.groupby("Category")["Amount"].sum().reset_index() 
-                category_totals = category_totals.sort_values(by="Amount", ascending=False)  # sort in descending order
-
-                # add budget information
-                category_totals["Budget"] = category_totals["Category"].map(
-                    lambda c: st.session_state.budgets.get(c, 0.0)
-                )
-                category_totals["Remaining"] = category_totals["Budget"] - category_totals["Amount"]
-                category_totals["% Used"] = category_totals.apply(
-                    lambda r: round((r["Amount"] / r["Budget"]) * 100, 1) if r["Budget"] > 0 else 0.0,
-                    axis=1,
-                )
-
-                st.dataframe(
-                    category_totals,
-                    column_config={
-                        "Amount": st.column_config.NumberColumn("Amount", format="%.2f AED"),
-                        "Budget": st.column_config.NumberColumn("Budget", format="%.2f AED"),
-                        "Remaining": st.column_config.NumberColumn("Remaining", format="%.2f AED"),
-                        "% Used": st.column_config.NumberColumn("% Used", format="%.1f %%"),
-                    },
-                    use_container_width=True,
-                    hide_index=True
-                )
-
-                fig = px.pie(
-                    category_totals, 
-                    values="Amount",
-                    names="Category",
-                    title="Expenses by Category",
-                )
-
-                test = px.bar(
-                    category_totals,
-                    x="Category",
-                    y="Amount",
-                    title="Expenses by Category - Bar Chart",
-                )
-                st.plotly_chart(fig, use_container_width=True)
-                st.plotly_chart(test, use_container_width=True)
+                    changed = (
+                        edited_df["Category"].to_numpy()
+                        != st.session_state.debits_df["Category"].to_numpy()
+                    )
+                    st.session_state.debits_df.loc[changed, "Category"] = edited_df.loc[changed, "Category"].values
+
+                    keywords_added = False
+                    changed_rows = edited_df.loc[changed, ["Category", "Details"]]
+                    for new_category_val, details in changed_rows.itertuples(index=False):
+                        keywords_added |= add_keyword_to_category(new_category_val, details, persist=False)
+                    if keywords_added:
+                        save_categories()  # one write for all the learned keywords
+
+                # tab switches rerun the script, so the read-only summary and charts are only built
+                # while this tab is open; the editing widgets above always render to keep their state
+                if tab1.open:
+                    st.subheader("Expense Summary")
+                    category_totals = sum_by_category(st.session_state.debits_df)
+
+                    # add budget information
+                    budget = (
+                        category_totals["Category"].map(st.session_state.budgets).astype(float).fillna(0.0).to_numpy()
+                    )
+                    amount = category_totals["Amount"].to_numpy()
+                    category_totals["Budget"] = budget
+                    category_totals["Remaining"] = budget - amount
+                    category_totals["% Used"] = np.where(
+                        budget > 0, np.round(amount / np.where(budget > 0, budget, 1) * 100, 1), 0.0
+                    )
+
+                    st.dataframe(
+                        category_totals,
+                        column_config={
+                            "Amount": st.column_config.NumberColumn("Amount", format="%.2f AED"),
+                            "Budget": st.column_config.NumberColumn("Budget", format="%.2f AED"),
+                            "Remaining": st.column_config.NumberColumn("Remaining", format="%.2f AED"),
+                            "% Used": st.column_config.NumberColumn("% Used", format="%.1f %%"),
+                        },
+                        use_container_width=True,
+                        hide_index=True
+                    )
+
+                    # both charts are built from the same arrays
+                    names = category_totals["Category"].to_numpy()
+                    values = category_totals["Amount"].to_numpy()
+                    if len(names) > chart_max_categories:
+                        # totals are sorted descending, so fold the long tail into a single "Other" entry
+                        names = np.append(names[:chart_max_categories], "Other")
+                        values = np.append(values[:chart_max_categories], values[chart_max_categories:].sum())
+
+                    fig = go.Figure(go.Pie(labels=names, values=values))
+                    fig.update_layout(title="Expenses by Category")
+
+                    bar_fig = go.Figure(go.Bar(x=names, y=values))
+                    bar_fig.update_layout(title="Expenses by Category - Bar Chart")
+                    st.plotly_chart(fig, use_container_width=True)
+                    st.plotly_chart(bar_fig, use_container_width=True)
 
             with tab2:
-                st.subheader("Payment Summary")
-                total_payments = credits_df["Amount"].sum()
-                st.metric("Total Payments", f"{total_payments:,.2f} AED")
-                st.write(credits_df)
+                if tab2.open:
+                    st.subheader("Payment Summary")
+                    total_payments = credits_df["Amount"].sum()
+                    st.metric("Total Payments", f"{total_payments:,.2f} AED")
+                    st.write(credits_df.drop(columns="_details_lc"))
 
 
 main()